@@ -1,27 +1,140 @@
 import sqlite3
+import atexit
 import os
 import sys
 import getpass
 import csv
+import re
+import queue
+import threading
+from contextlib import contextmanager
 from datetime import datetime
 
 DB_NAME = 'atm.db'
 LOG_FILE = 'transactions.log'
 ATM_CASH_LIMIT = 200000  # Total cash ATM can hold
 DAILY_WITHDRAWAL_LIMIT = 50000  # Per account daily withdrawal limit
-FAST_CASH_OPTIONS = [500, 1000, 5000]
+FAST_CASH_OPTIONS = (500, 1000, 5000)
+FAST_CASH_MENU = "Fast Cash Options:\n" + "\n".join(f"{i + 1}. ₹{a}" for i, a in enumerate(FAST_CASH_OPTIONS)) + "\n"
 MINI_STATEMENT_COUNT = 5
+READ_POOL_SIZE = 4  # Read-only connections kept alongside the single writer
+PAGE_CACHE_KIB = 65536  # Page cache budget shared by the pool (64 MB)
+_AMOUNT_RE = re.compile(r'^[1-9]\d{0,9}$')  # Positive whole amounts, no exceptions needed to validate
+
+# Menus are rendered with a single write per iteration
+MENU_TEXT = (
+    "\nATM Main Menu:\n"
+    "1. View Balance\n"
+    "2. Mini Statement\n"
+    "3. View Account Details\n"
+    "4. Withdraw Cash\n"
+    "5. Deposit Cash\n"
+    "6. Transfer Funds\n"
+    "7. Fast Cash\n"
+    "8. Change PIN\n"
+    "9. Exit\n"
+)
+ADMIN_MENU_TEXT = (
+    "\nAdmin Menu:\n"
+    "1. Load Cash into ATM\n"
+    "2. View ATM Total Cash\n"
+    "3. View Transaction Logs\n"
+    "4. Exit Admin Menu\n"
+)
+START_MENU_TEXT = "\n1. User Login\n2. Admin Menu\n3. Exit\n"
+
+# SQL used on the hot paths, kept as fixed strings so the statement cache always hits
+SQL_INSERT_ACCOUNT = 'INSERT INTO accounts (account_no, name, card_no, pin, balance) VALUES (?, ?, ?, ?, ?)'
+SQL_INSERT_ACCOUNT_IGNORE = 'INSERT OR IGNORE INTO accounts (account_no, name, card_no, pin, balance) VALUES (?, ?, ?, ?, ?)'
+SQL_GET_ACCT_BY_CARD = 'SELECT * FROM accounts WHERE card_no = ?'
+SQL_GET_ACCT_BY_NO = 'SELECT * FROM accounts WHERE account_no = ?'
+SQL_GET_TRANSFER_TARGET = 'SELECT account_no, balance FROM accounts WHERE account_no = ?'
+SQL_SET_PIN = 'UPDATE accounts SET pin = ? WHERE account_no = ?'
+SQL_CLEAR_FAILED_ATTEMPTS = 'UPDATE accounts SET failed_attempts = 0 WHERE account_no = ?'
+SQL_SET_LOGIN_STATE = 'UPDATE accounts SET failed_attempts = ?, blocked = ? WHERE account_no = ?'
+SQL_GET_BALANCE = 'SELECT balance FROM accounts WHERE account_no = ?'
+SQL_UPDATE_BALANCE = 'UPDATE accounts SET balance = ? WHERE account_no = ?'
+SQL_ADJUST_BALANCE = 'UPDATE accounts SET balance = balance + ?1 WHERE account_no = ?2 AND balance + ?1 >= 0 RETURNING balance'
+SQL_INSERT_TX = 'INSERT INTO transactions (account_no, type, amount, date, details) VALUES (?, ?, ?, ?, ?)'
+SQL_GET_TX = 'SELECT type, amount, date, details FROM transactions WHERE account_no = ? ORDER BY id DESC LIMIT ?'
+SQL_GET_ATM_CASH = 'SELECT total_cash FROM atm WHERE id = 1'
+SQL_UPDATE_ATM_CASH = 'UPDATE atm SET total_cash = ? WHERE id = 1'
+SQL_ADJUST_ATM_CASH = 'UPDATE atm SET total_cash = total_cash + ?1 WHERE id = 1 AND total_cash + ?1 BETWEEN 0 AND ?2 RETURNING total_cash'
+
+class ConnectionPool:
+    """
+    Holds one write connection and a queue of read-only connections.
+    Under WAL the readers never block the writer.
+    """
+    def __init__(self, db_name=DB_NAME, readers=READ_POOL_SIZE):
+        self.writer = self._connect(db_name, PAGE_CACHE_KIB)
+        self.writer.executescript('''
+            PRAGMA journal_mode=WAL;
+            PRAGMA wal_autocheckpoint=1000;
+        ''')
+        # Each reader keeps its own cursor so lookups don't allocate one per query
+        self._readers = queue.Queue()
+        self._reader_conns = []
+        if db_name in (':memory:', ''):
+            # In-memory and temporary databases are private to one connection, so a
+            # separate reader would see an empty database; read through the writer instead.
+            self._readers.put(self.writer.cursor())
+            readers = 0
+        for _ in range(readers):
+            conn = self._connect(db_name, PAGE_CACHE_KIB // readers)
+            conn.execute('PRAGMA query_only=1')
+            self._reader_conns.append(conn)
+            self._readers.put(conn.cursor())
+
+    @staticmethod
+    def _connect(db_name, cache_kib):
+        conn = sqlite3.connect(db_name, isolation_level=None, check_same_thread=False,
+                               cached_statements=256)
+        # The writer gets the full PAGE_CACHE_KIB page cache and the readers split another
+        # PAGE_CACHE_KIB between them, so the pool tops out at about 128 MB. Reads are served
+        # mostly from the 256 MB mmap window, whose pages live in the shared OS page cache
+        # rather than being copied per connection.
+        conn.executescript(f'''
+            PRAGMA synchronous=NORMAL;
+            PRAGMA temp_store=MEMORY;
+            PRAGMA cache_size=-{cache_kib};
+            PRAGMA mmap_size=268435456;
+        ''')
+        return conn
+
+    @contextmanager
+    def reader(self):
+        """
+        Borrows a cursor on a read-only connection and returns it to the pool afterwards.
+        """
+        cur = self._readers.get()
+        try:
+            yield cur
+        finally:
+            self._readers.put(cur)
+
+    def close(self):
+        for conn in self._reader_conns:
+            conn.close()
+        self._reader_conns = []
+        self.writer.close()
 
 class Database:
     """
     Handles all database operations for accounts and transactions.
     """
     def __init__(self, db_name=DB_NAME):
-        self.conn = sqlite3.connect(db_name)
+        self.pool = ConnectionPool(db_name)
+        # All writes go through the pool's single write connection
+        self.conn = self.pool.writer
+        # Read-through cache of account rows keyed by account_no, plus card_no -> account_no
+        self._acct_cache = {}
+        self._card_index = {}
         self.create_tables()
 
     def create_tables(self):
-        with self.conn:
+        self.conn.execute('BEGIN')
+        try:
             self.conn.execute('''
                 CREATE TABLE IF NOT EXISTS accounts (
                     account_no TEXT PRIMARY KEY,
@@ -49,60 +162,176 @@ class Database:
                     total_cash INTEGER
                 )
             ''')
+            # Mini statement lookups; the index implicitly carries the rowid (id), so
+            # ORDER BY id needs no sort. card_no is already indexed by its UNIQUE constraint.
+            self.conn.execute('CREATE INDEX IF NOT EXISTS idx_tx_acct ON transactions(account_no)')
             # Initialize ATM cash if not present
             cur = self.conn.execute('SELECT * FROM atm WHERE id = 1')
             if not cur.fetchone():
                 self.conn.execute('INSERT INTO atm (id, total_cash) VALUES (1, ?)', (ATM_CASH_LIMIT,))
+            self.conn.execute('COMMIT')
+        except Exception:
+            self.conn.execute('ROLLBACK')
+            raise
 
     def add_account(self, account_no, name, card_no, pin, balance):
         with self.conn:
-            self.conn.execute('''
-                INSERT INTO accounts (account_no, name, card_no, pin, balance) VALUES (?, ?, ?, ?, ?)
-            ''', (account_no, name, card_no, pin, balance))
+            self.conn.execute(SQL_INSERT_ACCOUNT, (account_no, name, card_no, pin, balance))
 
-    def get_account_by_card(self, card_no):
-        cur = self.conn.execute('SELECT * FROM accounts WHERE card_no = ?', (card_no,))
-        return cur.fetchone()
+    def add_accounts(self, rows):
+        """
+        Inserts (account_no, name, card_no, pin, balance) rows in one transaction, skipping existing accounts.
+        """
+        self.conn.execute('BEGIN')
+        try:
+            self.conn.executemany(SQL_INSERT_ACCOUNT_IGNORE, rows)
+            self.conn.execute('COMMIT')
+        except Exception:
+            self.conn.execute('ROLLBACK')
+            raise
+
+    def get_account_by_card(self, card_no, fresh=False):
+        """
+        Looks up an account by card. fresh=True skips the cache, for checks such as the
+        PIN and blocked flag that another terminal may have changed.
+        """
+        account_no = self._card_index.get(card_no)
+        if not fresh and account_no in self._acct_cache:
+            return self._acct_cache[account_no]
+        if account_no is not None:
+            self.invalidate_cache((account_no,))
+        with self.pool.reader() as cur:
+            cur.execute(SQL_GET_ACCT_BY_CARD, (card_no,))
+            row = cur.fetchone()
+        if row:
+            self._cache_account(row)
+        return row
 
     def get_account_by_no(self, account_no):
-        cur = self.conn.execute('SELECT * FROM accounts WHERE account_no = ?', (account_no,))
-        return cur.fetchone()
+        if account_no in self._acct_cache:
+            return self._acct_cache[account_no]
+        with self.pool.reader() as cur:
+            cur.execute(SQL_GET_ACCT_BY_NO, (account_no,))
+            row = cur.fetchone()
+        if row:
+            self._cache_account(row)
+        return row
+
+    def get_target_for_transfer(self, account_no):
+        """
+        Returns only (account_no, balance) for a transfer target.
+        """
+        row = self._acct_cache.get(account_no)
+        if row:
+            return row[0], row[4]
+        with self.pool.reader() as cur:
+            cur.execute(SQL_GET_TRANSFER_TARGET, (account_no,))
+            return cur.fetchone()
+
+    def _cache_account(self, row):
+        self._acct_cache[row[0]] = row
+        self._card_index[row[2]] = row[0]
+
+    def _update_cached(self, account_no, column, value):
+        row = self._acct_cache.get(account_no)
+        if row:
+            self._acct_cache[account_no] = row[:column] + (value,) + row[column + 1:]
+
+    def invalidate_cache(self, account_nos=None):
+        """
+        Drops cached account rows; all of them when no account numbers are given.
+        """
+        if account_nos is None:
+            self._acct_cache.clear()
+            self._card_index.clear()
+            return
+        for account_no in account_nos:
+            row = self._acct_cache.pop(account_no, None)
+            if row:
+                self._card_index.pop(row[2], None)
 
-    def update_account(self, account_no, **kwargs):
-        keys = ', '.join([f'{k} = ?' for k in kwargs])
-        values = list(kwargs.values())
-        values.append(account_no)
+    def set_pin(self, account_no, pin):
         with self.conn:
-            self.conn.execute(f'UPDATE accounts SET {keys} WHERE account_no = ?', values)
+            self.conn.execute(SQL_SET_PIN, (pin, account_no))
+        self._update_cached(account_no, 3, pin)
 
-    def add_transaction(self, account_no, type_, amount, details=''):
+    def clear_failed_attempts(self, account_no):
         with self.conn:
-            self.conn.execute('''
-                INSERT INTO transactions (account_no, type, amount, date, details) VALUES (?, ?, ?, ?, ?)
-            ''', (account_no, type_, amount, datetime.now().isoformat(), details))
+            self.conn.execute(SQL_CLEAR_FAILED_ATTEMPTS, (account_no,))
+        self._update_cached(account_no, 6, 0)
+
+    def set_login_state(self, account_no, failed_attempts, blocked):
+        with self.conn:
+            self.conn.execute(SQL_SET_LOGIN_STATE, (failed_attempts, blocked, account_no))
+        self._update_cached(account_no, 5, blocked)
+        self._update_cached(account_no, 6, failed_attempts)
 
     def get_transactions(self, account_no, limit=MINI_STATEMENT_COUNT):
-        cur = self.conn.execute('''
-            SELECT type, amount, date, details FROM transactions WHERE account_no = ? ORDER BY date DESC LIMIT ?
-        ''', (account_no, limit))
-        return cur.fetchall()
+        with self.pool.reader() as cur:
+            cur.execute(SQL_GET_TX, (account_no, limit))
+            return cur.fetchall()
 
     def get_balance(self, account_no):
-        cur = self.conn.execute('SELECT balance FROM accounts WHERE account_no = ?', (account_no,))
-        row = cur.fetchone()
+        with self.pool.reader() as cur:
+            cur.execute(SQL_GET_BALANCE, (account_no,))
+            row = cur.fetchone()
         return row[0] if row else None
 
     def update_balance(self, account_no, new_balance):
         with self.conn:
-            self.conn.execute('UPDATE accounts SET balance = ? WHERE account_no = ?', (new_balance, account_no))
+            self.conn.execute(SQL_UPDATE_BALANCE, (new_balance, account_no))
+        self._update_cached(account_no, 4, new_balance)
 
     def get_atm_cash(self):
-        cur = self.conn.execute('SELECT total_cash FROM atm WHERE id = 1')
-        return cur.fetchone()[0]
+        with self.pool.reader() as cur:
+            cur.execute(SQL_GET_ATM_CASH)
+            return cur.fetchone()[0]
 
     def update_atm_cash(self, new_cash):
         with self.conn:
-            self.conn.execute('UPDATE atm SET total_cash = ? WHERE id = 1', (new_cash,))
+            self.conn.execute(SQL_UPDATE_ATM_CASH, (new_cash,))
+
+    def adjust_atm_cash(self, delta, limit=ATM_CASH_LIMIT):
+        """
+        Adds delta to the ATM cash in SQL; returns the new total, or None if it would leave 0..limit.
+        """
+        row = self.conn.execute(SQL_ADJUST_ATM_CASH, (delta, limit)).fetchone()
+        return row[0] if row else None
+
+    def execute_tx(self, ops, account_nos=None):
+        """
+        Runs a list of (sql, params, required) tuples inside a single transaction and
+        returns the first row each op produced. If a required op (e.g. a guarded adjust)
+        produces no row, the whole transaction is rolled back and None is returned.
+        account_nos names the accounts the ops modify so their cached rows are dropped.
+        """
+        results = []
+        self.conn.execute('BEGIN IMMEDIATE')
+        try:
+            for sql, params, required in ops:
+                row = self.conn.execute(sql, params).fetchone()
+                if row is None and required:
+                    self.conn.execute('ROLLBACK')
+                    return None
+                results.append(row)
+            self.conn.execute('COMMIT')
+        except Exception:
+            self.conn.execute('ROLLBACK')
+            raise
+        finally:
+            self.invalidate_cache(account_nos)
+        return results
+
+    def close(self):
+        # Refresh planner statistics; analysis_limit samples a bounded number of rows per
+        # index so the cost stays flat as the transactions table grows
+        try:
+            self.conn.executescript('''
+                PRAGMA analysis_limit=400;
+                ANALYZE;
+            ''')
+        finally:
+            self.pool.close()
 
     def get_all_accounts(self):
         cur = self.conn.execute('SELECT * FROM accounts')
@@ -118,16 +347,59 @@ class Logger:
     """
     def __init__(self, log_file=LOG_FILE):
         self.log_file = log_file
+        self._fh = open(log_file, 'a', newline='', buffering=64 * 1024)
+        self._writer = csv.writer(self._fh)
+        # Callers only enqueue (timestamp, entry); the drain thread does all file I/O
+        self._queue = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._drain, daemon=True)
+        self._thread.start()
+        # The thread is a daemon, so make sure queued entries still reach disk at interpreter exit
+        atexit.register(self.close)
+
+    def _drain(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    self._fh.close()
+                    return
+                if isinstance(item, threading.Event):
+                    self._fh.flush()
+                    continue
+                timestamp, entry = item
+                if isinstance(entry, str):
+                    self._fh.write(f"{timestamp} - {entry}\n")
+                else:
+                    self._writer.writerow([timestamp, *entry])
+            except Exception as e:
+                # Keep draining so flush() and close() never wait on a dead thread
+                print(f"Failed to write log entry: {e}", file=sys.stderr)
+            finally:
+                if isinstance(item, threading.Event):
+                    item.set()
 
     def log(self, message):
-        with open(self.log_file, 'a') as f:
-            f.write(f"{datetime.now().isoformat()} - {message}\n")
-            
-
-    def log_transaction(self, account_no, type_, amount, details=''):
-        with open(self.log_file, 'a', newline='') as f:
-            writer = csv.writer(f)
-            writer.writerow([datetime.now().isoformat(), account_no, type_, amount, details])
+        self._queue.put((datetime.now().isoformat(), message))
+
+    def log_transaction(self, account_no, type_, amount, details='', timestamp=None):
+        if timestamp is None:
+            timestamp = datetime.now().isoformat()
+        self._queue.put((timestamp, (account_no, type_, amount, details)))
+
+    def flush(self):
+        """
+        Blocks until everything queued so far has been written and flushed.
+        """
+        done = threading.Event()
+        self._queue.put(done)
+        done.wait()
+
+    def close(self):
+        if not self._thread.is_alive():
+            return
+        atexit.unregister(self.close)
+        self._queue.put(None)
+        self._thread.join()
 
 class Account:
     """
@@ -143,6 +415,51 @@ class Account:
         self.balance = account_row[4]
         self.blocked = account_row[5]
         self.failed_attempts = account_row[6]
+        # Cash withdrawals and deposits are applied here first and written back by flush()
+        self.dirty = False
+        self.atm_cash_delta = 0
+        self._balance_delta = 0
+        self._pending_tx = []
+
+    def record(self, type_, amount, delta, timestamp, details=''):
+        """
+        Applies a cash transaction to the in-memory balance and queues it for flush().
+        """
+        self.balance += delta
+        self._balance_delta += delta
+        self.atm_cash_delta += delta
+        self._pending_tx.append((self.account_no, type_, amount, timestamp, details))
+        self.dirty = True
+
+    def flush(self):
+        """
+        Writes the session's pending balance change, ATM cash change and transactions in one transaction.
+        """
+        if not self.dirty:
+            return True
+        ops = [
+            (SQL_ADJUST_BALANCE, (self._balance_delta, self.account_no), True),
+            (SQL_ADJUST_ATM_CASH, (self.atm_cash_delta, ATM_CASH_LIMIT), True),
+        ]
+        ops.extend((SQL_INSERT_TX, row, False) for row in self._pending_tx)
+        try:
+            results = self.db.execute_tx(ops, account_nos=(self.account_no,))
+        except sqlite3.Error as e:
+            self.logger.log(f"Write-back error for account {self.account_no}: {e}")
+            results = None
+        if results is None:
+            # The pending state is kept so a later flush() can retry; each unsaved row is
+            # logged so the transaction log shows exactly what never reached the database
+            print("Could not save pending transactions. Please contact the bank.")
+            for row in self._pending_tx:
+                self.logger.log(f"Write-back failed for account {self.account_no}, unsaved transaction: {row}")
+            return False
+        self.balance = results[0][0]
+        self.dirty = False
+        self.atm_cash_delta = 0
+        self._balance_delta = 0
+        self._pending_tx = []
+        return True
 
     def view_balance(self):
         print(f"\nCurrent Balance: ₹{self.balance}")
@@ -151,6 +468,7 @@ class Account:
         print(f"\nAccount Number: {self.account_no}\nName: {self.name}\nCard Number: {self.card_no}")
 
     def view_mini_statement(self):
+        self.flush()
         print("\nMini Statement (Last Transactions):")
         transactions = self.db.get_transactions(self.account_no)
         for t in transactions:
@@ -166,7 +484,7 @@ class Account:
         if new_pin != confirm_pin:
             print("PINs do not match.")
             return
-        self.db.update_account(self.account_no, pin=new_pin)
+        self.db.set_pin(self.account_no, new_pin)
         self.pin = new_pin
         print("PIN changed successfully.")
         self.logger.log(f"PIN changed for account {self.account_no}")
@@ -175,14 +493,14 @@ class ATM:
     """
     Main ATM class handling authentication, transactions, and admin features.
     """
-    def __init__(self):
-        self.db = Database()
+    def __init__(self, db=None):
+        self.db = db if db is not None else Database()
         self.logger = Logger()
         self.current_account = None
 
     def authenticate(self):
         card_no = input("Enter Card Number: ")
-        account_row = self.db.get_account_by_card(card_no)
+        account_row = self.db.get_account_by_card(card_no, fresh=True)
         if not account_row:
             print("Card not found.")
             self.logger.log(f"Failed login attempt: Card {card_no} not found.")
@@ -191,146 +509,161 @@ class ATM:
             print("This card is blocked due to multiple failed attempts.")
             self.logger.log(f"Blocked card login attempt: {card_no}")
             return False
-        for attempt in range(3):
-            pin = getpass.getpass("Enter PIN: ")
-            if pin == account_row[3]:
-                self.db.update_account(account_row[0], failed_attempts=0)
-                self.current_account = Account(self.db, self.logger, account_row)
-                return True
-            else:
+        # Count failures locally and persist them with a single UPDATE once the loop ends;
+        # the finally makes sure an interrupted login (Ctrl-C, EOF) still records them
+        failed = account_row[6]
+        authenticated = False
+        try:
+            for attempt in range(3):
+                pin = getpass.getpass("Enter PIN: ")
+                if pin == account_row[3]:
+                    authenticated = True
+                    break
                 print("Incorrect PIN.")
-                self.db.update_account(account_row[0], failed_attempts=account_row[6]+1)
-                if account_row[6]+1 >= 3:
-                    self.db.update_account(account_row[0], blocked=1)
-                    print("Card blocked after 3 failed attempts.")
-                    self.logger.log(f"Card {card_no} blocked after 3 failed attempts.")
-                    return False
+                failed += 1
+                if failed >= 3:
+                    break
+        finally:
+            if authenticated:
+                if account_row[6]:
+                    self.db.clear_failed_attempts(account_row[0])
+            elif failed != account_row[6]:
+                self.db.set_login_state(account_row[0], failed, 1 if failed >= 3 else 0)
+        if authenticated:
+            self.current_account = Account(self.db, self.logger, account_row)
+            return True
+        if failed >= 3:
+            print("Card blocked after 3 failed attempts.")
+            self.logger.log(f"Card {card_no} blocked after 3 failed attempts.")
         return False
 
     def main_menu(self):
-        while True:
-            print("\nATM Main Menu:")
-            print("1. View Balance")
-            print("2. Mini Statement")
-            print("3. View Account Details")
-            print("4. Withdraw Cash")
-            print("5. Deposit Cash")
-            print("6. Transfer Funds")
-            print("7. Fast Cash")
-            print("8. Change PIN")
-            print("9. Exit")
-            choice = input("Select an option: ")
-            if not self.current_account:
-                print("No account is currently logged in.")
-                return
-            if choice == '1':
-                self.current_account.view_balance()
-            elif choice == '2':
-                self.current_account.view_mini_statement()
-            elif choice == '3':
-                self.current_account.view_details()
-            elif choice == '4':
-                self.withdraw_cash()
-            elif choice == '5':
-                self.deposit_cash()
-            elif choice == '6':
-                self.transfer_funds()
-            elif choice == '7':
-                self.fast_cash()
-            elif choice == '8':
-                self.current_account.change_pin()
-            elif choice == '9':
-                print("Thank you for using the ATM. Goodbye!")
-                self.current_account = None
-                break
-            else:
-                print("Invalid option. Try again.")
+        try:
+            while True:
+                sys.stdout.write(MENU_TEXT)
+                sys.stdout.flush()
+                choice = input("Select an option: ")
+                if not self.current_account:
+                    print("No account is currently logged in.")
+                    return
+                if choice == '1':
+                    self.current_account.view_balance()
+                elif choice == '2':
+                    self.current_account.view_mini_statement()
+                elif choice == '3':
+                    self.current_account.view_details()
+                elif choice == '4':
+                    self.withdraw_cash()
+                elif choice == '5':
+                    self.deposit_cash()
+                elif choice == '6':
+                    self.transfer_funds()
+                elif choice == '7':
+                    self.fast_cash()
+                elif choice == '8':
+                    self.current_account.change_pin()
+                elif choice == '9':
+                    self._end_session()
+                    print("Thank you for using the ATM. Goodbye!")
+                    break
+                else:
+                    print("Invalid option. Try again.")
+        finally:
+            # However the session ends (including Ctrl-C or EOF), pending cash must reach the DB
+            self._end_session()
+
+    def _end_session(self):
+        """
+        Writes back the logged-in account and logs the user out. A failed write-back is
+        reported and logged row by row by Account.flush, and the user is still allowed to leave.
+        """
+        account, self.current_account = self.current_account, None
+        if account:
+            account.flush()
 
     def withdraw_cash(self):
         if not self.current_account:
             print("No account is currently logged in.")
             return
-        amount = input("Enter amount to withdraw: ")
-        try:
-            amount = int(amount)
-        except ValueError:
+        amount = input("Enter amount to withdraw: ").strip()
+        if not _AMOUNT_RE.match(amount):
             print("Invalid amount.")
             return
-        if amount <= 0:
-            print("Amount must be positive.")
-            return
+        self._do_withdraw(int(amount), 'Withdraw')
+
+    def _do_withdraw(self, amount, type_label):
+        """
+        Shared core of withdraw_cash and fast_cash: checks limits, then records and logs the withdrawal.
+        """
         if amount > self.current_account.balance:
             print("Insufficient balance.")
             return
         if amount > DAILY_WITHDRAWAL_LIMIT:
             print(f"Exceeds daily withdrawal limit of ₹{DAILY_WITHDRAWAL_LIMIT}.")
             return
-        atm_cash = self.db.get_atm_cash()
+        atm_cash = self.db.get_atm_cash() + self.current_account.atm_cash_delta
         if amount > atm_cash:
             print("ATM does not have enough cash.")
             return
-        new_balance = self.current_account.balance - amount
-        self.db.update_balance(self.current_account.account_no, new_balance)
-        self.db.update_atm_cash(atm_cash - amount)
-        self.db.add_transaction(self.current_account.account_no, 'Withdraw', amount)
-        self.logger.log_transaction(self.current_account.account_no, 'Withdraw', amount)
-        self.current_account.balance = new_balance
-        print(f"Withdrawn ₹{amount}. New balance: ₹{new_balance}")
+        ts = datetime.now().isoformat()
+        self.current_account.record(type_label, amount, -amount, ts)
+        self.logger.log_transaction(self.current_account.account_no, type_label, amount, timestamp=ts)
+        print(f"Withdrawn ₹{amount}. New balance: ₹{self.current_account.balance}")
 
     def deposit_cash(self):
         if not self.current_account:
             print("No account is currently logged in.")
             return
-        amount = input("Enter amount to deposit: ")
-        try:
-            amount = int(amount)
-        except ValueError:
+        amount = input("Enter amount to deposit: ").strip()
+        if not _AMOUNT_RE.match(amount):
             print("Invalid amount.")
             return
-        if amount <= 0:
-            print("Amount must be positive.")
-            return
-        atm_cash = self.db.get_atm_cash()
+        amount = int(amount)
+        atm_cash = self.db.get_atm_cash() + self.current_account.atm_cash_delta
         if atm_cash + amount > ATM_CASH_LIMIT:
             print("ATM cannot accept this much cash. Exceeds ATM limit.")
             return
-        new_balance = self.current_account.balance + amount
-        self.db.update_balance(self.current_account.account_no, new_balance)
-        self.db.update_atm_cash(atm_cash + amount)
-        self.db.add_transaction(self.current_account.account_no, 'Deposit', amount)
-        self.logger.log_transaction(self.current_account.account_no, 'Deposit', amount)
-        self.current_account.balance = new_balance
-        print(f"Deposited ₹{amount}. New balance: ₹{new_balance}")
+        ts = datetime.now().isoformat()
+        self.current_account.record('Deposit', amount, amount, ts)
+        self.logger.log_transaction(self.current_account.account_no, 'Deposit', amount, timestamp=ts)
+        print(f"Deposited ₹{amount}. New balance: ₹{self.current_account.balance}")
 
     def transfer_funds(self):
         if not self.current_account:
             print("No account is currently logged in.")
             return
         target_acc = input("Enter target account number: ")
-        target_row = self.db.get_account_by_no(target_acc)
+        if target_acc == self.current_account.account_no:
+            print("Cannot transfer to the same account.")
+            return
+        target_row = self.db.get_target_for_transfer(target_acc)
         if not target_row:
             print("Target account not found.")
             return
-        amount = input("Enter amount to transfer: ")
-        try:
-            amount = int(amount)
-        except ValueError:
+        amount = input("Enter amount to transfer: ").strip()
+        if not _AMOUNT_RE.match(amount):
             print("Invalid amount.")
             return
-        if amount <= 0:
-            print("Amount must be positive.")
-            return
+        amount = int(amount)
         if amount > self.current_account.balance:
             print("Insufficient balance.")
             return
-        new_balance = self.current_account.balance - amount
-        target_balance = target_row[4] + amount
-        self.db.update_balance(self.current_account.account_no, new_balance)
-        self.db.update_balance(target_acc, target_balance)
-        self.db.add_transaction(self.current_account.account_no, 'Transfer Out', amount, f"To {target_acc}")
-        self.db.add_transaction(target_acc, 'Transfer In', amount, f"From {self.current_account.account_no}")
-        self.logger.log_transaction(self.current_account.account_no, 'Transfer Out', amount, f"To {target_acc}")
-        self.logger.log_transaction(target_acc, 'Transfer In', amount, f"From {self.current_account.account_no}")
+        # Transfers touch another account, so pending session changes are written first
+        if not self.current_account.flush():
+            return
+        ts = datetime.now().isoformat()
+        results = self.db.execute_tx([
+            (SQL_ADJUST_BALANCE, (-amount, self.current_account.account_no), True),
+            (SQL_ADJUST_BALANCE, (amount, target_acc), True),
+            (SQL_INSERT_TX, (self.current_account.account_no, 'Transfer Out', amount, ts, f"To {target_acc}"), False),
+            (SQL_INSERT_TX, (target_acc, 'Transfer In', amount, ts, f"From {self.current_account.account_no}"), False),
+        ], account_nos=(self.current_account.account_no, target_acc))
+        if results is None:
+            print("Transaction declined.")
+            return
+        new_balance = results[0][0]
+        self.logger.log_transaction(self.current_account.account_no, 'Transfer Out', amount, f"To {target_acc}", timestamp=ts)
+        self.logger.log_transaction(target_acc, 'Transfer In', amount, f"From {self.current_account.account_no}", timestamp=ts)
         self.current_account.balance = new_balance
         print(f"Transferred ₹{amount} to {target_acc}. New balance: ₹{new_balance}")
 
@@ -338,47 +671,20 @@ class ATM:
         if not self.current_account:
             print("No account is currently logged in.")
             return
-        print("Fast Cash Options:")
-        for idx, amt in enumerate(FAST_CASH_OPTIONS, 1):
-            print(f"{idx}. ₹{amt}")
-        choice = input("Select option: ")
-        try:
-            idx = int(choice) - 1
-            amount = FAST_CASH_OPTIONS[idx]
-        except (ValueError, IndexError):
+        sys.stdout.write(FAST_CASH_MENU)
+        sys.stdout.flush()
+        choice = input("Select option: ").strip()
+        idx = int(choice) - 1 if choice.isdecimal() else -1
+        if not 0 <= idx < len(FAST_CASH_OPTIONS):
             print("Invalid option.")
             return
-        self.withdraw_cash_amount(amount)
-
-    def withdraw_cash_amount(self, amount):
-        if not self.current_account:
-            print("No account is currently logged in.")
-            return
-        if amount > self.current_account.balance:
-            print("Insufficient balance.")
-            return
-        if amount > DAILY_WITHDRAWAL_LIMIT:
-            print(f"Exceeds daily withdrawal limit of ₹{DAILY_WITHDRAWAL_LIMIT}.")
-            return
-        atm_cash = self.db.get_atm_cash()
-        if amount > atm_cash:
-            print("ATM does not have enough cash.")
-            return
-        new_balance = self.current_account.balance - amount
-        self.db.update_balance(self.current_account.account_no, new_balance)
-        self.db.update_atm_cash(atm_cash - amount)
-        self.db.add_transaction(self.current_account.account_no, 'Fast Cash', amount)
-        self.logger.log_transaction(self.current_account.account_no, 'Fast Cash', amount)
-        self.current_account.balance = new_balance
-        print(f"Withdrawn ₹{amount}. New balance: ₹{new_balance}")
+        self._do_withdraw(FAST_CASH_OPTIONS[idx], 'Fast Cash')
 
     # Admin features (optional)
     def admin_menu(self):
-        print("\nAdmin Menu:")
-        print("1. Load Cash into ATM")
-        print("2. View ATM Total Cash")
-        print("3. View Transaction Logs")
-        print("4. Exit Admin Menu")
+        self.db.invalidate_cache()
+        sys.stdout.write(ADMIN_MENU_TEXT)
+        sys.stdout.flush()
         while True:
             choice = input("Select an option: ")
             if choice == '1':
@@ -393,54 +699,57 @@ class ATM:
                 print("Invalid option.")
 
     def load_cash(self):
-        amount = input("Enter amount to load into ATM: ")
-        try:
-            amount = int(amount)
-        except ValueError:
+        amount = input("Enter amount to load into ATM: ").strip()
+        if not _AMOUNT_RE.match(amount):
             print("Invalid amount.")
             return
-        if amount <= 0:
-            print("Amount must be positive.")
-            return
-        atm_cash = self.db.get_atm_cash()
-        if atm_cash + amount > ATM_CASH_LIMIT:
+        amount = int(amount)
+        new_total = self.db.adjust_atm_cash(amount)
+        if new_total is None:
             print("Exceeds ATM cash limit.")
             return
-        self.db.update_atm_cash(atm_cash + amount)
-        print(f"Loaded ₹{amount} into ATM. New total: ₹{atm_cash + amount}")
+        print(f"Loaded ₹{amount} into ATM. New total: ₹{new_total}")
         self.logger.log(f"Admin loaded ₹{amount} into ATM.")
 
     def view_logs(self):
-        if not os.path.exists(LOG_FILE):
+        self.logger.flush()
+        if not os.path.exists(self.logger.log_file):
             print("No logs found.")
             return
-        with open(LOG_FILE, 'r') as f:
+        with open(self.logger.log_file, 'r') as f:
             print(f.read())
 
     def run(self):
         print("Welcome to the ATM CLI System!")
-        while True:
-            print("\n1. User Login\n2. Admin Menu\n3. Exit")
-            choice = input("Select an option: ")
-            if choice == '1':
-                if self.authenticate():
-                    self.main_menu()
-            elif choice == '2':
-                self.admin_menu()
-            elif choice == '3':
-                print("Exiting...")
-                break
-            else:
-                print("Invalid option.")
+        try:
+            while True:
+                sys.stdout.write(START_MENU_TEXT)
+                sys.stdout.flush()
+                choice = input("Select an option: ")
+                if choice == '1':
+                    if self.authenticate():
+                        self.main_menu()
+                elif choice == '2':
+                    self.admin_menu()
+                elif choice == '3':
+                    print("Exiting...")
+                    break
+                else:
+                    print("Invalid option.")
+        finally:
+            # Runs on EOF and Ctrl-C too, so queued log entries are never dropped
+            self.logger.close()
 
 # Sample database population for demo
 if __name__ == "__main__":
     # Populate sample data if not present
     db = Database()
-    logger = Logger()
-    if not db.get_account_by_card('1234567890'):
-        db.add_account('1001', 'Alice', '1234567890', '1111', 100000)
-    if not db.get_account_by_card('9876543210'):
-        db.add_account('1002', 'Bob', '9876543210', '2222', 50000)
-    atm = ATM()
-    atm.run() 
\ No newline at end of file
+    db.add_accounts([
+        ('1001', 'Alice', '1234567890', '1111', 100000),
+        ('1002', 'Bob', '9876543210', '2222', 50000),
+    ])
+    atm = ATM(db)
+    try:
+        atm.run()
+    finally:
+        db.close() 
\ No newline at end of file